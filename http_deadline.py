@@ -0,0 +1,78 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+import requests
+
+# 单次读取的块大小，每读一块检查一次截止时间
+CHUNK_SIZE = 8192
+
+
+class _Attempt:
+    """
+    在守护线程中发出一次 POST；调用方超时后直接放弃，守护线程不会拖住进程退出，
+    且线程自身也会在截止时间后的下一次读取时结束
+    """
+
+    def __init__(self, url, deadline_at: float, kwargs: dict):
+        self.url = url
+        self.deadline_at = deadline_at
+        self.kwargs = kwargs
+        self.future = Future()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def remaining(self) -> float:
+        return self.deadline_at - time.monotonic()
+
+    def run(self):
+        try:
+            # requests 的 timeout 只约束单次读写，响应体改为分块读取并检查截止时间
+            with requests.post(
+                self.url, stream=True, timeout=max(self.remaining(), 0.001), **self.kwargs
+            ) as response:
+                body = bytearray()
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    body += chunk
+                    if self.remaining() <= 0:
+                        raise TimeoutError("响应体读取超过截止时间")
+                response._content = bytes(body)
+            self.future.set_result(response)
+        except BaseException as e:
+            self.future.set_exception(e)
+
+
+def post_with_deadline(url, deadline: float, hedge_after: float = None, **kwargs) -> requests.Response:
+    """
+    在 deadline 秒内完成 POST（含连接、响应头和响应体），超时抛出 TimeoutError；
+    设置 hedge_after 时，首个请求超过该耗时会再发出一个相同请求，取先成功返回的结果
+    """
+    start = time.monotonic()
+    deadline_at = start + deadline
+
+    def remaining():
+        return deadline_at - time.monotonic()
+
+    pending = {_Attempt(url, deadline_at, kwargs).future}
+    hedged = hedge_after is None or hedge_after >= deadline
+    errors = []
+
+    while pending:
+        wait_for = remaining() if hedged else min(hedge_after - (time.monotonic() - start), remaining())
+        done, pending = wait(pending, timeout=max(wait_for, 0), return_when=FIRST_COMPLETED)
+
+        for future in done:
+            try:
+                return future.result()
+            except (requests.RequestException, TimeoutError) as e:
+                errors.append(e)
+
+        if remaining() <= 0:
+            break
+        if not hedged and (not pending or time.monotonic() - start >= hedge_after):
+            # 超过对冲阈值，或首个请求已失败，补发一个请求
+            pending.add(_Attempt(url, deadline_at, kwargs).future)
+            hedged = True
+
+    if errors and not pending:
+        raise errors[-1]
+    raise TimeoutError(f"请求超过截止时间 {deadline} 秒")
@@ -0,0 +1,499 @@
+"""
+压测 / 长稳测试：用本地替身服务模拟订单详情、库存列表和 Bark 接口，
+驱动 yu7_notify 的轮询 -> 变更检测 -> 通知流程，以及库存查询流程，
+输出延迟分布、内存增长、文件描述符 / 连接数和单核可承载的订单轮询速率
+
+用法：
+    python load_harness.py --orders 500 --duration 60
+    python load_harness.py --orders 5000 --rate 3000 --duration 14400 --report-every 300
+"""
+import argparse
+import bisect
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import xiaomi_inventory_filter as inventory
+import yu7_notify
+
+BIN = os.path.dirname(os.path.realpath(__file__))
+
+# 合成数据使用的订单状态流转，仅用于模拟状态变化
+ORDER_STATUSES = [
+    (2100, "已支付"),
+    (2300, "已锁单"),
+    (2520, "生产中"),
+    (2600, "运输中"),
+    (2800, "待交付"),
+]
+GOODS_NAMES = ["小米YU7 标准版", "小米YU7 Pro", "小米YU7 Max"]
+EXTERIORS = ["深海蓝", "宝石绿", "钛金属色", "熔岩橙", "珍珠白"]
+WHEELS = ["20英寸幻刃轮毂", "21英寸锻造梅花轮毂", "19英寸运动轮毂"]
+INTERIORS = ["松石灰内饰", "鸢尾紫内饰", "珊瑚橙内饰"]
+AUDIO = ["豪华音响", "标准音响"]
+CARSHOP_NOTICES = ["账号内暂无绑定车辆，请绑定后再来购买", "暂不符合购买条件", "可购买延保服务"]
+
+
+# =====================
+# 合成数据
+# =====================
+class FleetState:
+    """替身服务端持有的订单与库存状态，每次被轮询时按概率推进"""
+
+    def __init__(self, seed: int, change_prob: float, inventory_size: int):
+        self.rng = random.Random(seed)
+        self.change_prob = change_prob
+        self.inventory_size = inventory_size
+        self.lock = threading.Lock()
+        self.orders = {}
+        self.inventory = [self.new_inventory_item(i) for i in range(inventory_size)]
+        self.inventory.sort(key=lambda item: int(item["marketPrice"]))
+        self.next_item_id = inventory_size
+        # 延保状态按账号（Cookie）各自维护，与订单状态一样按概率推进
+        self.carshop_notices = {}
+
+    def new_order(self, order_id: str) -> dict:
+        rng = self.rng
+        lock_time = datetime.now() - timedelta(days=rng.randint(1, 120), seconds=rng.randint(0, 86400))
+        add_time = lock_time - timedelta(days=rng.randint(0, 7))
+        return {
+            "orderId": order_id,
+            "status": rng.randint(0, 2),
+            "weeks": rng.randint(4, 40),
+            # 约三成订单只返回一个周数区间（按锁单日期推算）
+            "single_range": rng.random() < 0.3,
+            "vid": "",
+            "add_time": add_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "lock_time": lock_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "goods": rng.choice(GOODS_NAMES),
+        }
+
+    def advance_order(self, order: dict):
+        rng = self.rng
+        if rng.random() >= self.change_prob:
+            return
+        change = rng.choice(("weeks", "status", "vid"))
+        if change == "weeks" and order["weeks"] > 0:
+            order["weeks"] -= 1
+        elif change == "status" and order["status"] < len(ORDER_STATUSES) - 1:
+            order["status"] += 1
+        elif change == "vid":
+            if not order["vid"]:
+                order["vid"] = f"LXM{rng.randint(10 ** 13, 10 ** 14 - 1)}"
+            elif not order["vid"].startswith("HXM"):
+                order["vid"] = "H" + order["vid"][1:]
+
+    @staticmethod
+    def delivery_time(order: dict) -> str:
+        weeks = order["weeks"]
+        if order["single_range"]:
+            return f"锁定订单后预计{weeks}-{weeks + 3}周交付"
+        total = weeks + 25
+        return f"锁定订单后预计{total}-{total + 3}周交付，预计还需{weeks}-{weeks + 3}周"
+
+    def order_detail(self, order_id: str) -> dict:
+        with self.lock:
+            order = self.orders.get(order_id)
+            if order is None:
+                order = self.orders[order_id] = self.new_order(order_id)
+            else:
+                self.advance_order(order)
+            status, status_name = ORDER_STATUSES[order["status"]]
+            return {
+                "code": 0,
+                "data": {
+                    "backdropPictures": {"backdropPicture": None},
+                    "statusInfo": {"orderStatus": status, "orderStatusName": status_name},
+                    "buyCarInfo": {"vid": order["vid"]},
+                    "orderTimeInfo": {
+                        "deliveryTime": self.delivery_time(order),
+                        "addTime": order["add_time"],
+                        "payTime": order["add_time"],
+                        "lockTime": order["lock_time"],
+                    },
+                    "orderItem": [{"goodsName": order["goods"]}],
+                },
+            }
+
+    def carshop_info(self, account: str) -> dict:
+        with self.lock:
+            notice = self.carshop_notices.get(account)
+            if notice is None:
+                notice = self.rng.choice(CARSHOP_NOTICES[:2])
+            elif self.rng.random() < self.change_prob:
+                notice = self.rng.choice([n for n in CARSHOP_NOTICES if n != notice])
+            self.carshop_notices[account] = notice
+            return {"code": 0, "data": {"product": {"notice": notice}}}
+
+    def new_inventory_item(self, item_id: int) -> dict:
+        rng = self.rng
+        ssu_info = " | ".join((
+            rng.choice(EXTERIORS), rng.choice(WHEELS), rng.choice(INTERIORS), rng.choice(AUDIO)
+        ))
+        return {
+            "inventoryId": str(item_id),
+            "classify": rng.choice(GOODS_NAMES),
+            "marketPrice": str(rng.randrange(253900, 429900, 1000)),
+            "ssuInfo": ssu_info,
+        }
+
+    def inventory_page(self, page_no: int, page_size: int) -> dict:
+        with self.lock:
+            # 模拟放量：随机售出部分车辆并补入新车
+            if self.rng.random() < self.change_prob:
+                for _ in range(max(1, self.inventory_size // 50)):
+                    self.inventory.pop(self.rng.randrange(len(self.inventory)))
+                    self.inventory.append(self.new_inventory_item(self.next_item_id))
+                    self.next_item_id += 1
+                self.inventory.sort(key=lambda item: int(item["marketPrice"]))
+            start = (page_no - 1) * page_size
+            return {
+                "code": 0,
+                "message": "成功",
+                "data": {"total": len(self.inventory), "items": self.inventory[start:start + page_size]},
+            }
+
+
+def run_stub_server(port_queue, seed: int, change_prob: float, inventory_size: int):
+    """在独立进程中运行替身服务，避免其 CPU 开销计入被测进程"""
+    state = FleetState(seed, change_prob, inventory_size)
+    stats = {"requests": 0, "open_connections": 0, "max_connections": 0}
+    stats_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def setup(self):
+            super().setup()
+            with stats_lock:
+                stats["open_connections"] += 1
+                stats["max_connections"] = max(stats["max_connections"], stats["open_connections"])
+
+        def finish(self):
+            super().finish()
+            with stats_lock:
+                stats["open_connections"] -= 1
+
+        def reply(self, body: dict):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                with stats_lock:
+                    self.reply(dict(stats, orders=len(state.orders)))
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"null")
+            with stats_lock:
+                stats["requests"] += 1
+
+            if self.path.endswith("/order/detail"):
+                self.reply(state.order_detail(payload[0]["orderId"]))
+            elif self.path.endswith("/carlife/product/info"):
+                self.reply(state.carshop_info(self.headers.get("Cookie", "")))
+            elif self.path.endswith("/inventory/list"):
+                self.reply(state.inventory_page(payload[0]["pageNo"], payload[0]["pageSize"]))
+            elif self.path.startswith("/bark/"):
+                self.reply({"code": 200, "message": "success"})
+            else:
+                self.send_error(404)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+# =====================
+# 指标
+# =====================
+class LatencyHistogram:
+    """固定对数分桶（0.1ms ~ 60s，相邻桶 ×1.2），长时间运行内存占用恒定"""
+
+    BOUNDS = [0.1 * 1.2 ** i for i in range(int(math.log(600000, 1.2)) + 1)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.total = 0
+        self.max = 0.0
+
+    def record(self, ms: float):
+        self.counts[bisect.bisect_left(self.BOUNDS, ms)] += 1
+        self.total += 1
+        self.max = max(self.max, ms)
+
+    def percentile(self, p: float) -> float:
+        if not self.total:
+            return 0.0
+        target = math.ceil(self.total * p / 100)
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.BOUNDS[idx], self.max) if idx < len(self.BOUNDS) else self.max
+        return self.max
+
+    def summary(self) -> str:
+        return (
+            f"n={self.total} p50={self.percentile(50):.1f}ms p95={self.percentile(95):.1f}ms "
+            f"p99={self.percentile(99):.1f}ms max={self.max:.1f}ms"
+        )
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # 非 Linux 环境退化为峰值常驻内存
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def fd_counts():
+    """返回 (文件描述符数, 其中的 socket 数)，不支持 /proc 时返回 (None, None)"""
+    fd_dir = "/proc/self/fd"
+    if not os.path.isdir(fd_dir):
+        return None, None
+    fds = sockets = 0
+    for name in os.listdir(fd_dir):
+        try:
+            target = os.readlink(os.path.join(fd_dir, name))
+        except OSError:
+            continue
+        fds += 1
+        if target.startswith("socket:"):
+            sockets += 1
+    return fds, sockets
+
+
+# =====================
+# 被测流程
+# =====================
+def configure_targets(base_url: str, work_dir: str):
+    """把脚本的上游地址和状态文件指向替身服务与临时目录"""
+    yu7_notify.ORDER_DETAIL_URL = f"{base_url}/mtop/car-order/order/detail"
+    yu7_notify.CARSHOP_URL = f"{base_url}/mtop/carlife/product/info"
+    yu7_notify.BARK_URL = f"{base_url}/bark/{{token}}"
+    inventory.API_URL = f"{base_url}/mtop/guidemarketing/product/car/inventory/list"
+
+    # yu7_notify 以脚本方式运行时由 __main__ 设置的全局变量
+    yu7_notify.config_path = os.path.join(work_dir, "config.toml")
+    shutil.copy(os.path.join(BIN, "configBAK.toml"), yu7_notify.config_path)
+    yu7_notify.args = argparse.Namespace(cookie=None)
+    yu7_notify.remarks = "--load harness"
+    yu7_notify.error_times = 0
+    yu7_notify.carshop_notice = None
+
+
+def carshop_cookie(order_id: str) -> str:
+    # 每个订单模拟独立账号，替身服务按 Cookie 维护各自的延保状态
+    return f"serviceToken=load-carshop-{order_id}"
+
+
+def seed_state(order_ids, last_state: dict, errors: Counter):
+    """
+    预热：记录每个订单当前的交付时间与延保状态，相当于各订单的 config.toml 已有上次结果，
+    避免首轮轮询全部被计为变化
+    """
+    for order_id in order_ids:
+        def fetch():
+            notice, _ = yu7_notify.get_carshop_info(carshop_cookie(order_id))
+            detail = yu7_notify.get_order_detail(order_id, "load-user", "serviceToken=load")
+            last_state[order_id] = (detail[0], notice)
+        guarded(fetch, errors)
+
+
+def guarded(fn, errors: Counter) -> bool:
+    """执行一次轮询，上游异常按类型计数后继续运行，返回是否成功"""
+    try:
+        fn()
+        return True
+    except (TimeoutError, requests.Timeout):
+        errors["timeout"] += 1
+    except requests.RequestException as e:
+        errors[type(e).__name__] += 1
+    except ValueError:
+        # 响应不是合法 JSON
+        errors["bad_response"] += 1
+    except SystemExit:
+        # 脚本在参数错误 / 接口失败时直接退出
+        errors["exit"] += 1
+    return False
+
+
+def poll_order(order_id: str, last_state: dict, histograms: dict) -> bool:
+    """
+    按 yu7_notify 单次运行的流程轮询一个订单：查询延保状态与订单详情，
+    再交给 yu7_notify.handle_order_update 判定、保存和推送。
+    last_state 模拟每个订单各自 config.toml 中保存的上次交付时间与延保状态
+    """
+    start = time.perf_counter()
+    old_delivery_time, old_carshop_notice = last_state.get(order_id, (None, None))
+
+    carshop_notice, _ = yu7_notify.get_carshop_info(carshop_cookie(order_id))
+    carshop_done = time.perf_counter()
+    histograms["carshop"].record((carshop_done - start) * 1000)
+
+    delivery_time, order_status, message, order_status_name, logo_link, vid = (
+        yu7_notify.get_order_detail(order_id, "load-user", "serviceToken=load")
+    )
+    fetched = time.perf_counter()
+    histograms["order_detail"].record((fetched - carshop_done) * 1000)
+
+    # send_bark_message 读取的全局变量
+    yu7_notify.delivery_time = delivery_time
+    yu7_notify.device_tokens = [f"token-{order_id}"]
+    outcome = yu7_notify.handle_order_update(
+        delivery_time, order_status, message, order_status_name, logo_link, vid,
+        old_delivery_time, carshop_notice, old_carshop_notice,
+    )
+    if outcome == "updated":
+        last_state[order_id] = (delivery_time, carshop_notice)
+    if outcome != "unchanged":
+        histograms["notify"].record((time.perf_counter() - fetched) * 1000)
+
+    histograms["cycle"].record((time.perf_counter() - start) * 1000)
+    return outcome != "unchanged"
+
+
+def poll_inventory(index, logger, histograms: dict, max_price: float):
+    start = time.perf_counter()
+    inventory.query_inventory("serviceToken=load", logger, index, max_price=max_price)
+    histograms["inventory"].record((time.perf_counter() - start) * 1000)
+
+
+def report(label: str, elapsed: float, polls: int, notifications: int, cpu: float,
+           histograms: dict, rss_start: float, lag: float, server_stats: dict, errors: Counter):
+    fds, sockets = fd_counts()
+    rate = polls / elapsed * 60 if elapsed else 0
+    per_core = polls / cpu * 60 if cpu else 0
+    rss = rss_mb()
+    print(f"========== {label} | 运行 {elapsed:.0f}s ==========")
+    print(f"轮询 {polls} 次（{rate:.0f} 单/分钟），推送 {notifications} 次，调度滞后 {lag:.1f}s")
+    print(f"CPU {cpu:.1f}s，单核上限约 {per_core:.0f} 单/分钟")
+    print(f"错误 {sum(errors.values())} 次（超时 {errors['timeout']}）：{dict(errors)}")
+    print(f"内存 RSS {rss:.1f}MB（增长 {rss - rss_start:+.1f}MB），fd {fds}，socket {sockets}")
+    if server_stats:
+        print(
+            f"替身服务：请求 {server_stats['requests']}，当前连接 {server_stats['open_connections']}，"
+            f"峰值连接 {server_stats['max_connections']}，订单 {server_stats['orders']}"
+        )
+    for name, histogram in histograms.items():
+        print(f"  {name:<12} {histogram.summary()}")
+
+
+def fetch_server_stats(base_url: str) -> dict:
+    try:
+        return requests.get(f"{base_url}/stats", timeout=5).json()
+    except Exception:
+        return {}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="订单轮询 / 库存查询压测")
+    parser.add_argument("--orders", type=int, default=500, help="模拟订单数")
+    parser.add_argument("--duration", type=float, default=60, help="运行时长（秒）")
+    parser.add_argument("--rate", type=float, default=0, help="目标轮询速率（单/分钟），0 表示不限速")
+    parser.add_argument("--change-prob", type=float, default=0.05, help="每次轮询订单 / 库存发生变化的概率")
+    parser.add_argument("--inventory-size", type=int, default=600, help="模拟库存车辆数")
+    parser.add_argument("--inventory-every", type=int, default=100, help="每轮询多少个订单执行一次库存查询，0 表示关闭")
+    parser.add_argument("--max-price", type=float, default=None, help="库存查询的价格预算")
+    parser.add_argument("--report-every", type=float, default=30, help="中间报告间隔（秒）")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.ERROR, format="%(message)s")
+    logger = logging.getLogger("load_harness")
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=run_stub_server,
+        args=(port_queue, args.seed, args.change_prob, args.inventory_size),
+        daemon=True,
+    )
+    server.start()
+    base_url = f"http://127.0.0.1:{port_queue.get(timeout=10)}"
+
+    work_dir = tempfile.mkdtemp(prefix="yu7_load_")
+    configure_targets(base_url, work_dir)
+
+    order_ids = [f"{5200000000000000 + i}" for i in range(args.orders)]
+    last_state = {}
+    errors = Counter()
+    seed_state(order_ids, last_state, errors)
+    index = inventory.InventoryIndex()
+    histograms = {name: LatencyHistogram() for name in ("carshop", "order_detail", "notify", "cycle", "inventory")}
+
+    interval = 60 / args.rate if args.rate else 0
+    polls = notifications = 0
+    lag = 0.0
+    rss_start = rss_mb()
+    cpu_start = time.process_time()
+    start = next_report = time.monotonic()
+    next_report += args.report_every
+    deadline = start + args.duration
+
+    try:
+        while time.monotonic() < deadline:
+            order_id = order_ids[polls % len(order_ids)]
+            if interval:
+                due = start + polls * interval
+                now = time.monotonic()
+                if due > now:
+                    time.sleep(due - now)
+                else:
+                    lag = now - due
+
+            changed = []
+            guarded(lambda: changed.append(poll_order(order_id, last_state, histograms)), errors)
+            if any(changed):
+                notifications += 1
+            polls += 1
+
+            if args.inventory_every and polls % args.inventory_every == 0:
+                guarded(lambda: poll_inventory(index, logger, histograms, args.max_price), errors)
+
+            now = time.monotonic()
+            if now >= next_report:
+                report("中间报告", now - start, polls, notifications, time.process_time() - cpu_start,
+                       histograms, rss_start, lag, fetch_server_stats(base_url), errors)
+                next_report = now + args.report_every
+    except KeyboardInterrupt:
+        pass
+    finally:
+        report("最终报告", time.monotonic() - start, polls, notifications, time.process_time() - cpu_start,
+               histograms, rss_start, lag, fetch_server_stats(base_url), errors)
+        server.terminate()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
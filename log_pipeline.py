@@ -0,0 +1,153 @@
+import argparse
+import atexit
+import json
+import logging
+import queue
+import re
+import sys
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+# =====================
+# 脱敏规则
+# =====================
+REDACTED = "***"
+
+# 运行时登记的敏感值（Cookie、userId、deviceToken 等），出现即替换
+_secrets = set()
+
+REDACT_PATTERNS = (
+    # Cookie: xxx / "Cookie": "xxx"
+    re.compile(r"(\b(?:carshop)?cookie[\"']?\s*[:：=]\s*[\"']?)[^\"'\n,}]+", re.IGNORECASE),
+    # serviceToken=xxx; userId=xxx; 等 Cookie 片段
+    re.compile(r"(\b(?:serviceToken\w*|cUserId|userId|device_?token|wechat_key)[\"']?\s*[:：=]\s*[\"']?)[^\"'\s;,&}]+", re.IGNORECASE),
+    # Bark 推送地址中的 device token
+    re.compile(r"(api\.day\.app/)[^/\s\"']+"),
+)
+
+# LogRecord 自带字段，其余字段视为 extra 结构化数据
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+def register_secret(*values):
+    for value in values:
+        # 过短的值替换容易误伤正常文本
+        if value and len(str(value)) >= 4:
+            _secrets.add(str(value))
+
+
+def redact(text: str) -> str:
+    for secret in list(_secrets):
+        if secret in text:
+            text = text.replace(secret, REDACTED)
+    for pattern in REDACT_PATTERNS:
+        text = pattern.sub(rf"\g<1>{REDACTED}", text)
+    return text
+
+
+def redact_value(value):
+    """递归脱敏 extra 中的字符串、dict 和 list / tuple"""
+    if isinstance(value, str):
+        return redact(value)
+    if isinstance(value, dict):
+        return {key: redact_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact_value(item) for item in value)
+    return value
+
+
+class RedactingFilter(logging.Filter):
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        if record.exc_info:
+            record.exc_text = redact(logging.Formatter().formatException(record.exc_info))
+            record.exc_info = None
+        for key, value in list(vars(record).items()):
+            if key not in _RECORD_ATTRS:
+                setattr(record, key, redact_value(value))
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """按 event 采样：rates={"inventory_match": 10} 表示每 10 条保留 1 条"""
+
+    def __init__(self, rates: dict = None):
+        super().__init__()
+        self.rates = rates or {}
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        event = getattr(record, "event", None)
+        rate = self.rates.get(event)
+        if not rate or rate <= 1:
+            return True
+        with self.lock:
+            count = self.counts.get(event, 0)
+            self.counts[event] = count + 1
+        return count % rate == 0
+
+
+class JsonLineFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RawQueueHandler(QueueHandler):
+    """直接入队原始记录，消息格式化与脱敏都在后台线程完成"""
+
+    def prepare(self, record):
+        return record
+
+
+def sample_rate(value: str):
+    """argparse type：解析 EVENT=N 采样配置"""
+    event, _, rate = value.partition("=")
+    if not event or not rate.isdigit() or int(rate) < 1:
+        raise argparse.ArgumentTypeError(f"格式应为 EVENT=N（N 为正整数）：{value}")
+    return event, int(rate)
+
+
+def setup_logging(log_format: str = "text", level=logging.WARNING, sample_rates=None):
+    """
+    text：保持原有的纯文本输出
+    json：JSON Lines 输出，经队列交给后台线程脱敏并写入 stderr，不阻塞主流程
+    """
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.setLevel(level)
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.addFilter(RedactingFilter())
+    sampling = SamplingFilter(dict(sample_rates or ()))
+
+    if log_format == "json":
+        stream_handler.setFormatter(JsonLineFormatter())
+        queue_handler = RawQueueHandler(queue.SimpleQueue())
+        # 采样在入队前完成；入队的记录也不在调用线程格式化
+        queue_handler.addFilter(sampling)
+        root.addHandler(queue_handler)
+
+        listener = QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(message)s"))
+        stream_handler.addFilter(sampling)
+        root.addHandler(stream_handler)
@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from http_deadline import post_with_deadline  # noqa: E402
+
+
+class TrickleHandler(BaseHTTPRequestHandler):
+    """/trickle 每秒只发送 1 字节响应体；/slow-first 首个请求卡住，之后立即返回"""
+
+    calls = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        type(self).calls += 1
+        if self.path == "/trickle":
+            self.send_response(200)
+            self.send_header("Content-Length", "100")
+            self.end_headers()
+            try:
+                for _ in range(100):
+                    self.wfile.write(b"x")
+                    self.wfile.flush()
+                    time.sleep(1)
+            except OSError:
+                pass
+        elif self.path == "/slow-first":
+            if type(self).calls == 1:
+                time.sleep(3)
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PostWithDeadlineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), TrickleHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        TrickleHandler.calls = 0
+
+    def test_trickling_body_hits_deadline(self):
+        start = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            post_with_deadline(f"{self.base_url}/trickle", 2, data="{}")
+        self.assertLess(time.monotonic() - start, 3.5)
+
+    def test_trickling_request_does_not_block_exit(self):
+        code = (
+            "import sys\n"
+            f"sys.path.insert(0, {ROOT!r})\n"
+            "from http_deadline import post_with_deadline\n"
+            "try:\n"
+            f"    post_with_deadline({self.base_url + '/trickle'!r}, 2, data='{{}}')\n"
+            "except TimeoutError:\n"
+            "    sys.exit(1)\n"
+        )
+        start = time.monotonic()
+        result = subprocess.run([sys.executable, "-c", code], timeout=20)
+        self.assertEqual(result.returncode, 1)
+        self.assertLess(time.monotonic() - start, 6)
+
+    def test_hedged_request_returns_first_success(self):
+        start = time.monotonic()
+        response = post_with_deadline(f"{self.base_url}/slow-first", 5, hedge_after=0.3, data="{}")
+        self.assertEqual(response.json(), {})
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(TrickleHandler.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
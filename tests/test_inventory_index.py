@@ -0,0 +1,126 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from xiaomi_inventory_filter import (  # noqa: E402
+    InventoryIndex,
+    WISHLIST,
+    match_ssu_info,
+    merge_conditions,
+    parse_ssu_info,
+)
+
+WISHED = "深海蓝 | 21英寸幻刃轮毂 | 松石灰内饰 | 豪华音响"
+
+
+def car(ssu_info, price, inventory_id=None, classify="YU7 Max"):
+    item = {"classify": classify, "marketPrice": str(price), "ssuInfo": ssu_info}
+    if inventory_id is not None:
+        item["inventoryId"] = inventory_id
+    return item
+
+
+class ParseSsuInfoTest(unittest.TestCase):
+    def test_known_names_are_normalised(self):
+        facets = parse_ssu_info(WISHED)
+        self.assertEqual(facets["exterior"], {"深海蓝"})
+        self.assertEqual(facets["wheels"], {"幻刃轮毂"})
+        self.assertEqual(facets["interior"], {"松石灰"})
+        self.assertEqual(facets["audio"], {"豪华音响"})
+        self.assertEqual(facets["other"], set())
+
+    def test_options_with_color_character_are_not_exterior(self):
+        facets = parse_ssu_info(WISHED + " | 红色卡钳")
+        self.assertEqual(facets["exterior"], {"深海蓝"})
+        self.assertEqual(facets["other"], {"红色卡钳"})
+
+    def test_single_space_separated_options_are_kept(self):
+        facets = parse_ssu_info("深海蓝 20英寸幻刃轮毂 松石灰内饰 豪华音响 红色卡钳 碳纤维套件")
+        self.assertEqual(facets["wheels"], {"幻刃轮毂"})
+        self.assertEqual(facets["other"], {"红色卡钳", "碳纤维套件"})
+
+    def test_unknown_names_fall_back_to_keywords(self):
+        facets = parse_ssu_info("流光银车漆 | 19英寸运动轮毂 | 标准音响")
+        self.assertEqual(facets["exterior"], {"流光银车漆"})
+        self.assertEqual(facets["wheels"], {"19英寸运动轮毂"})
+        self.assertEqual(facets["audio"], {"标准音响"})
+
+    def test_empty(self):
+        self.assertTrue(all(not values for values in parse_ssu_info("").values()))
+
+
+class MatchSsuInfoTest(unittest.TestCase):
+    def test_wishlist(self):
+        self.assertTrue(match_ssu_info(WISHED))
+        self.assertTrue(match_ssu_info("深海蓝 | 锻造梅花轮毂 | 珊瑚橙内饰 | 豪华音响"))
+        self.assertFalse(match_ssu_info("珍珠白 | 21英寸幻刃轮毂 | 松石灰内饰 | 豪华音响"))
+        self.assertFalse(match_ssu_info("深海蓝 | 21英寸幻刃轮毂 | 松石灰内饰 | 标准音响"))
+        self.assertFalse(match_ssu_info(""))
+
+
+class InventoryIndexTest(unittest.TestCase):
+    def test_update_tracks_added_removed_and_changed(self):
+        index = InventoryIndex()
+        a = car(WISHED, 320000, "a")
+        b = car("珍珠白 | 锻造梅花轮毂 | 鸢尾紫内饰 | 豪华音响", 300000, "b")
+        self.assertEqual(index.update([a, b]), (2, 0))
+        self.assertEqual(index.update([a, b]), (0, 0))
+
+        repainted = car("珍珠白 | 锻造梅花轮毂 | 鸢尾紫内饰 | 标准音响", 290000, "b")
+        self.assertEqual(index.update([a, repainted]), (0, 0))
+        self.assertEqual(index.count(audio="标准音响"), 1)
+        self.assertEqual(index.count(interior="鸢尾紫", audio="豪华音响"), 0)
+
+        self.assertEqual(index.update([repainted]), (0, 1))
+        self.assertEqual(index.count(exterior="深海蓝"), 0)
+        self.assertNotIn(("exterior", "深海蓝"), index.postings)
+
+        self.assertEqual(index.update([]), (0, 1))
+        self.assertEqual(index.items, {})
+        self.assertEqual(dict(index.postings), {})
+
+    def test_items_without_id_get_synthetic_keys(self):
+        index = InventoryIndex()
+        twins = [car(WISHED, 320000), car(WISHED, 320000)]
+        self.assertEqual(index.update(twins), (2, 0))
+        self.assertEqual(index.count(exterior="深海蓝"), 2)
+        self.assertEqual(index.update(twins[:1]), (0, 1))
+        self.assertEqual(index.count(exterior="深海蓝"), 1)
+
+    def test_query_with_max_price_and_or_within_facet(self):
+        index = InventoryIndex()
+        index.update([
+            car(WISHED, 320000, "a"),
+            car("深海蓝 | 锻造梅花轮毂 | 鸢尾紫内饰 | 豪华音响", 350000, "b"),
+            car("深海蓝 | 锻造梅花轮毂 | 珊瑚橙内饰 | 标准音响", 300000, "c"),
+            car(WISHED, "待定", "d"),
+        ])
+        self.assertEqual(index.count(exterior="深海蓝", audio="豪华音响"), 3)
+        self.assertEqual(index.count(max_price=330000, exterior="深海蓝", audio="豪华音响"), 1)
+        self.assertEqual(index.count(interior=("松石灰", "鸢尾紫")), 3)
+        self.assertEqual(len(index.query(**WISHLIST)), 3)
+        self.assertEqual(index.count(), 4)
+        with self.assertRaises(ValueError):
+            index.query(color="深海蓝")
+
+    def test_facet_counts(self):
+        index = InventoryIndex()
+        index.update([
+            car(WISHED, 320000, "a"),
+            car("深海蓝 | 锻造梅花轮毂 | 鸢尾紫内饰 | 豪华音响", 350000, "b"),
+            car("珍珠白 | 锻造梅花轮毂 | 鸢尾紫内饰 | 豪华音响", 300000, "c"),
+        ])
+        self.assertEqual(index.facet_counts("exterior"), {"深海蓝": 2, "珍珠白": 1})
+        self.assertEqual(index.facet_counts("interior"), {"松石灰": 1, "鸢尾紫": 2})
+
+
+class MergeConditionsTest(unittest.TestCase):
+    def test_repeated_facets_are_merged(self):
+        merged = merge_conditions([("interior", ("松石灰",)), ("audio", ("豪华音响",)), ("interior", ("鸢尾紫", "松石灰"))])
+        self.assertEqual(merged, {"interior": ("松石灰", "鸢尾紫"), "audio": ("豪华音响",)})
+
+
+if __name__ == "__main__":
+    unittest.main()
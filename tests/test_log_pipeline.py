@@ -0,0 +1,66 @@
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import log_pipeline  # noqa: E402
+
+
+class LogPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.handler = logging.StreamHandler(self.stream)
+        self.handler.addFilter(log_pipeline.RedactingFilter())
+        self.handler.setFormatter(log_pipeline.JsonLineFormatter())
+        self.logger = logging.getLogger(f"test.{self.id()}")
+        self.logger.addHandler(self.handler)
+        self.logger.propagate = False
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+
+    def entries(self):
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_redacts_message_and_nested_extras(self):
+        log_pipeline.register_secret("device-token-1234")
+        self.logger.warning(
+            "push to https://api.day.app/device-token-1234/x, the key=value stays",
+            extra={"headers": {"Cookie": "serviceToken=abc; userId=42"}, "tokens": ["device-token-1234"]},
+        )
+        entry = self.entries()[0]
+        self.assertNotIn("device-token-1234", entry["msg"])
+        self.assertIn("the key=value stays", entry["msg"])
+        self.assertEqual(entry["headers"], {"Cookie": "serviceToken=***; userId=***"})
+        self.assertEqual(entry["tokens"], ["***"])
+
+    def test_exception_is_emitted_separately(self):
+        try:
+            raise ValueError("Cookie: serviceToken=abc")
+        except ValueError:
+            self.logger.exception("failed")
+        entry = self.entries()[0]
+        self.assertEqual(entry["msg"], "failed")
+        self.assertIn("ValueError", entry["exc"])
+        self.assertNotIn("abc", entry["exc"])
+
+    def test_raw_queue_handler_defers_formatting(self):
+        record = logging.makeLogRecord({"msg": "%s", "args": ("late",)})
+        prepared = log_pipeline.RawQueueHandler(None).prepare(record)
+        self.assertIs(prepared, record)
+        self.assertEqual(prepared.args, ("late",))
+
+    def test_sample_rate_argument(self):
+        self.assertEqual(log_pipeline.sample_rate("inventory_match=10"), ("inventory_match", 10))
+        for value in ("foo", "foo=", "foo=0", "foo=x"):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                log_pipeline.sample_rate(value)
+
+
+if __name__ == "__main__":
+    unittest.main()
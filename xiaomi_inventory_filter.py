@@ -1,10 +1,20 @@
 import argparse
+import copy
 import json
 import logging
+import os
+import re
 import sys
 import time
+from collections import Counter, defaultdict
 from datetime import datetime, timedelta
-import requests
+import toml
+
+from http_deadline import post_with_deadline
+from log_pipeline import register_secret, sample_rate, setup_logging
+
+BIN = os.path.dirname(os.path.realpath(__file__))
+config_path = os.path.join(BIN, "config.toml")
 
 API_URL = "https://api.retail.xiaomiev.com/mtop/guidemarketing/product/car/inventory/list"
 
@@ -52,30 +62,58 @@ PAYLOAD = [{
     "pageSize": 200
 }]
 
+# 单次库存查询的端到端截止时间（秒），包含对冲请求
+REQUEST_DEADLINE = 15
+# 首个请求超过该耗时（约为接口 p95 延迟）仍未返回时发出对冲请求；None 表示关闭
+HEDGE_AFTER = None
+# 价格预算，配合 priceAsc 排序，超出预算后停止扫描与翻页；None 表示只查第一页
+MAX_PRICE = None
 
-def setup_logger():
-    logging.basicConfig(
-        level=logging.WARNING,
-        format="%(message)s"
-    )
+
+def setup_logger(args):
+    setup_logging(args.log_format, sample_rates=args.log_sample)
+    register_secret(args.cookie)
     return logging.getLogger(__name__)
 
 
+def facet_condition(value: str):
+    facet, sep, values = value.partition("=")
+    if not sep or facet not in FACETS or not values:
+        raise argparse.ArgumentTypeError(f"格式应为 FACET=V1[,V2]，FACET 取值：{', '.join(FACETS)}")
+    return facet, tuple(v for v in values.split(",") if v)
+
+
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("--cookie", required=True, help="serviceTokenCar Cookie")
+    parser.add_argument("--deadline", type=float, default=REQUEST_DEADLINE,
+                        help="库存查询端到端截止时间（秒）")
+    parser.add_argument("--hedge-after", type=float, default=HEDGE_AFTER,
+                        help="首个请求超过该耗时（秒，建议取 p95）后发出对冲请求")
+    parser.add_argument("--max-price", type=float, default=MAX_PRICE,
+                        help="价格预算（与 marketPrice 同单位），设置后逐页查询直到超出预算")
+    parser.add_argument("--count", action="append", type=facet_condition, metavar="FACET=V1[,V2]",
+                        help="只查询一次并统计命中数量，如 --count exterior=深海蓝 --count audio=豪华音响")
+    parser.add_argument("--facet-counts", action="append", choices=FACETS, metavar="FACET",
+                        help="只查询一次并输出该分面各取值的车辆数，如 --facet-counts interior")
+    parser.add_argument("--log-format", choices=["text", "json"], default="text",
+                        help="日志格式，json 为 JSON Lines 并由后台线程写出")
+    parser.add_argument("--log-sample", action="append", type=sample_rate, metavar="EVENT=N",
+                        help="高频日志采样，如 inventory_match=10 表示每 10 条保留 1 条")
     return parser.parse_args()
 
 
-def request_inventory(cookie: str) -> dict:
+def request_inventory(cookie: str, payload: list = PAYLOAD,
+                      deadline: float = REQUEST_DEADLINE, hedge_after: float = HEDGE_AFTER) -> dict:
     headers = HEADERS_TEMPLATE.copy()
     headers["Cookie"] = cookie
 
-    resp = requests.post(
+    resp = post_with_deadline(
         API_URL,
+        deadline,
+        hedge_after,
         headers=headers,
-        data=json.dumps(PAYLOAD),
-        timeout=15
+        data=json.dumps(payload),
     )
 
     if resp.status_code != 200:
@@ -84,74 +122,382 @@ def request_inventory(cookie: str) -> dict:
     return resp.json()
 
 
-def match_ssu_info(ssu_info: str) -> bool:
+# =====================
+# ssuInfo 分面解析
+# =====================
+FACETS = ("exterior", "wheels", "interior", "audio", "other")
+
+# 已知配置名称，命中后统一归一化为该名称，便于精确查询
+FACET_VOCAB = {
+    "exterior": ("深海蓝", "宝石绿", "流金粉", "钛金属色", "熔岩橙", "寒武岩灰", "珍珠白", "曜石黑", "翡翠绿"),
+    "wheels": ("幻刃轮毂", "锻造梅花轮毂"),
+    "interior": ("松石灰", "鸢尾紫", "珊瑚橙"),
+    "audio": ("豪华音响",),
+}
+
+# 未收录名称时按关键字归类，保留原文作为取值
+FACET_KEYWORDS = {
+    "wheels": ("轮毂", "轮圈"),
+    "interior": ("内饰",),
+    "audio": ("音响",),
+    "exterior": ("车漆", "外观"),
+}
+
+# 空格同样视为分隔，避免单空格分隔的选装项整段被已知名称吞掉
+SSU_SPLIT_PATTERN = re.compile(r"[|｜,，、;；/+\s]+")
+
+# 心愿单：同一分面内任一取值命中即可，不同分面之间需全部命中
+WISHLIST = {
+    "exterior": ("深海蓝",),
+    "wheels": ("幻刃轮毂", "锻造梅花轮毂"),
+    "audio": ("豪华音响",),
+    "interior": ("松石灰", "鸢尾紫", "珊瑚橙"),
+    # "interior": ("松石灰", "鸢尾紫"),
+}
+
+
+def parse_ssu_info(ssu_info: str) -> dict:
+    """将 ssuInfo 文本拆分为 {分面: {取值}}"""
+    facets = {facet: set() for facet in FACETS}
     if not ssu_info:
-        return False
+        return facets
+
+    for token in SSU_SPLIT_PATTERN.split(ssu_info):
+        token = token.strip()
+        if not token:
+            continue
+
+        hit = False
+        for facet, names in FACET_VOCAB.items():
+            for name in names:
+                if name in token:
+                    facets[facet].add(name)
+                    hit = True
+        if hit:
+            continue
+
+        for facet, keywords in FACET_KEYWORDS.items():
+            if any(keyword in token for keyword in keywords):
+                facets[facet].add(token)
+                break
+        else:
+            facets["other"].add(token)
 
-    color_ok = "深海蓝" in ssu_info
-    wheel_ok = ("幻刃轮毂" in ssu_info) or ("锻造梅花轮毂" in ssu_info)
-    audio_ok = "豪华音响" in ssu_info
-    interior_ok = ("松石灰" in ssu_info) or ("鸢尾紫" in ssu_info) or ("珊瑚橙" in ssu_info)
-    # interior_ok = ("松石灰" in ssu_info) or ("鸢尾紫" in ssu_info)
+    return facets
 
-    return color_ok and wheel_ok and audio_ok and interior_ok
+
+def parse_price(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class InventoryIndex:
+    """分面倒排索引：取值 -> 车辆 key，每次拉取后增量更新"""
+
+    ID_FIELDS = ("inventoryId", "vin", "carId", "id")
+
+    def __init__(self):
+        self.items = {}
+        self.prices = {}
+        self.postings = defaultdict(set)
+        self._facets = {}
+
+    def _item_keys(self, items):
+        # 接口未返回唯一 ID 时，用配置 + 价格 + 序号区分同配置的多台车
+        seen = Counter()
+        for item in items:
+            for field in self.ID_FIELDS:
+                if item.get(field):
+                    yield (field, item[field]), item
+                    break
+            else:
+                base = (item.get("classify"), item.get("ssuInfo", ""), item.get("marketPrice"))
+                seen[base] += 1
+                yield base + (seen[base],), item
+
+    def _add(self, key, item):
+        facets = parse_ssu_info(item.get("ssuInfo", ""))
+        self.items[key] = item
+        self.prices[key] = parse_price(item.get("marketPrice"))
+        self._facets[key] = facets
+        for facet, values in facets.items():
+            for value in values:
+                self.postings[(facet, value)].add(key)
+
+    def _remove(self, key):
+        for facet, values in self._facets.pop(key).items():
+            for value in values:
+                posting = self.postings[(facet, value)]
+                posting.discard(key)
+                if not posting:
+                    del self.postings[(facet, value)]
+        del self.items[key]
+        del self.prices[key]
+
+    def update(self, items):
+        """以本次拉取结果为准：新增车辆入索引，已下架车辆移除，返回 (新增数, 移除数)"""
+        current = dict(self._item_keys(items))
+        removed = [key for key in self.items if key not in current]
+        for key in removed:
+            self._remove(key)
+
+        added = 0
+        for key, item in current.items():
+            if key in self.items:
+                if self.items[key] == item:
+                    continue
+                self._remove(key)
+            else:
+                added += 1
+            self._add(key, item)
+        return added, len(removed)
+
+    def query(self, max_price=None, **conditions):
+        """conditions 形如 exterior="深海蓝" 或 interior=("松石灰", "鸢尾紫")"""
+        keys = None
+        # 先处理候选最少的分面，缩小求交范围
+        postings = []
+        for facet, values in conditions.items():
+            if facet not in FACETS:
+                raise ValueError(f"未知分面：{facet}")
+            if isinstance(values, str):
+                values = (values,)
+            matched = set()
+            for value in values:
+                matched |= self.postings.get((facet, value), set())
+            postings.append(matched)
+
+        for matched in sorted(postings, key=len):
+            keys = matched if keys is None else keys & matched
+            if not keys:
+                return []
+        if keys is None:
+            keys = set(self.items)
+
+        if max_price is not None:
+            keys = {
+                key for key in keys
+                if self.prices[key] is not None and self.prices[key] <= max_price
+            }
+        return [self.items[key] for key in keys]
+
+    def count(self, max_price=None, **conditions) -> int:
+        return len(self.query(max_price=max_price, **conditions))
+
+    def facet_counts(self, facet: str) -> dict:
+        return {
+            value: len(keys)
+            for (name, value), keys in self.postings.items()
+            if name == facet
+        }
+
+
+def load_sale_config_filters(path: str = config_path) -> dict:
+    """
+    从 config.toml 的 [[inventory.saleConfigFilters]] 读取服务端筛选项：
+    facet / value 对应心愿单的分面取值，filter 为抓包得到的 saleConfigFilterList 条目，原样发送
+    """
+    if not os.path.exists(path):
+        return {}
+    entries = toml.load(path).get("inventory", {}).get("saleConfigFilters", [])
+    return {(entry["facet"], entry["value"]): entry["filter"] for entry in entries}
+
+
+# 服务端筛选项：(分面, 取值) -> saleConfigFilterList 条目，未登记的取值只在本地过滤
+SALE_CONFIG_FILTERS = load_sale_config_filters()
+
+
+def build_sale_config_filters(wishlist: dict = WISHLIST) -> list:
+    filters = []
+    for facet, values in wishlist.items():
+        entries = [SALE_CONFIG_FILTERS.get((facet, value)) for value in values]
+        # 同一分面的候选取值必须全部可映射，否则服务端会漏掉未映射的候选
+        if not all(entries):
+            continue
+        for entry in entries:
+            if entry not in filters:
+                filters.append(entry)
+    return filters
+
+
+def build_inventory_payload(wishlist: dict = WISHLIST, page_no: int = 1) -> list:
+    payload = copy.deepcopy(PAYLOAD)
+    payload[0]["conditions"]["saleConfigFilterList"] = build_sale_config_filters(wishlist)
+    payload[0]["pageNo"] = page_no
+    return payload
+
+
+def iter_inventory_pages(cookie: str, wishlist: dict = WISHLIST,
+                         deadline: float = REQUEST_DEADLINE, hedge_after: float = HEDGE_AFTER,
+                         all_pages: bool = True):
+    """逐页请求库存，调用方停止迭代即不再翻页；all_pages=False 时只请求第一页"""
+    page_no = 1
+    while True:
+        payload = build_inventory_payload(wishlist, page_no)
+        resp_json = request_inventory(cookie, payload, deadline, hedge_after)
+        yield resp_json
+
+        if not all_pages:
+            return
+
+        data = resp_json.get("data") or {}
+        items = data.get("items") or []
+        page_size = payload[0]["pageSize"]
+        if resp_json.get("code") != 0 or len(items) < page_size or page_no * page_size >= (data.get("total") or 0):
+            return
+        page_no += 1
+
+
+def split_by_budget(items: list, max_price: float = None):
+    """items 已按价格升序，返回 (预算内的车辆, 是否已超出预算)"""
+    if max_price is None:
+        return items, False
+    for idx, item in enumerate(items):
+        price = parse_price(item.get("marketPrice"))
+        if price is not None and price > max_price:
+            return items[:idx], True
+    return items, False
+
+
+def match_facets(facets: dict, wishlist: dict = WISHLIST) -> bool:
+    return all(facets.get(facet, set()) & set(values) for facet, values in wishlist.items())
 
 
-def query_inventory(cookie: str, logger):
+def match_ssu_info(ssu_info: str) -> bool:
+    if not ssu_info:
+        return False
+
+    return match_facets(parse_ssu_info(ssu_info))
+
+
+def pull_inventory(cookie: str, logger, deadline: float = REQUEST_DEADLINE,
+                   hedge_after: float = HEDGE_AFTER, max_price: float = MAX_PRICE,
+                   all_pages: bool = False) -> list:
+    """
+    拉取库存并校验返回，失败时终止执行；
+    未设置预算时与原先一致只查第一页，设置预算后翻页直到价格超出预算
+    """
+    items = []
+    pages = 0
+    all_pages = all_pages or max_price is not None
+    pages_iter = iter_inventory_pages(cookie, WISHLIST, deadline, hedge_after, all_pages)
+    while True:
+        try:
+            resp_json = next(pages_iter, None)
+        except Exception as e:
+            logger.error(f"接口请求失败：{e}")
+            sys.exit(1)
+        if resp_json is None:
+            break
+        pages += 1
+
+        # 🔍 接口返回校验日志
+        code = resp_json.get("code")
+        message = resp_json.get("message")
+        data = resp_json.get("data") or {}
+        total = data.get("total")
+
+        logger.warning(
+            "接口返回校验：page=%s code=%s message=%s total=%s", pages, code, message, total,
+            extra={"event": "inventory_response", "page": pages, "code": code, "total": total},
+        )
+
+        if code != 0:
+            logger.error("接口返回非成功状态，终止执行")
+            sys.exit(1)
+
+        page_items, over_budget = split_by_budget(data.get("items") or [], max_price)
+        items.extend(page_items)
+        if over_budget:
+            logger.warning("价格已超出预算 %s，停止翻页", max_price,
+                           extra={"event": "budget_cutoff", "page": pages, "max_price": max_price})
+            break
+
+    return items
+
+
+def query_inventory(cookie: str, logger, index: InventoryIndex = None,
+                    deadline: float = REQUEST_DEADLINE, hedge_after: float = HEDGE_AFTER,
+                    max_price: float = MAX_PRICE):
     logger.warning("========== 库存接口查询开始 ==========")
-    try:
-        resp_json = request_inventory(cookie)
-    except Exception as e:
-        logger.error(f"接口请求失败：{e}")
-        sys.exit(1)
-
-    # 🔍 接口返回校验日志
-    code = resp_json.get("code")
-    message = resp_json.get("message")
-    data = resp_json.get("data", {})
-    total = data.get("total")
-
-    logger.warning("========== 接口返回校验 ==========")
-    logger.warning(f"code: {code}")
-    logger.warning(f"message: {message}")
-    logger.warning(f"total: {total}")
-    logger.warning("=================================")
-
-    if code != 0:
-        logger.error("接口返回非成功状态，终止执行")
-        sys.exit(1)
-
-    items = data.get("items", [])
+    items = pull_inventory(cookie, logger, deadline, hedge_after, max_price)
+
+    # 空结果同样要更新索引，移除已售出的车辆
+    if index is None:
+        index = InventoryIndex()
+    added, removed = index.update(items)
+    logger.warning(
+        "索引更新：新增 %s，移除 %s，当前 %s", added, removed, len(index.items),
+        extra={"event": "index_update", "added": added, "removed": removed, "size": len(index.items)},
+    )
+
     if not items:
         logger.warning("接口返回 items 为空")
         return False  # 未命中
 
-    matched = []
-    for item in items:
-        ssu_info = item.get("ssuInfo", "")
-        if match_ssu_info(ssu_info):
-            matched.append({
-                "classify": item.get("classify"),
-                "marketPrice": item.get("marketPrice"),
-                "ssuInfo": ssu_info
-            })
+    matched = [
+        {
+            "classify": item.get("classify"),
+            "marketPrice": item.get("marketPrice"),
+            "ssuInfo": item.get("ssuInfo", "")
+        }
+        for item in index.query(**WISHLIST)
+    ]
+    matched.sort(key=lambda car: parse_price(car["marketPrice"]) or 0)
 
     if not matched:
         logger.warning("未发现满足条件的现车配置")
         return False
 
-    logger.warning("========== 命中现车配置 ==========")
+    logger.warning("========== 命中现车配置：%s 台 ==========", len(matched),
+                   extra={"event": "inventory_matched", "count": len(matched)})
     for idx, car in enumerate(matched, 1):
-        logger.warning(f"[{idx}] classify: {car['classify']}")
-        logger.warning(f"    marketPrice: {car['marketPrice']}")
-        logger.warning(f"    ssuInfo: {car['ssuInfo']}")
-    logger.warning("==================================")
+        # 逐台日志量大，使用惰性格式化，被采样丢弃时不产生开销
+        logger.warning(
+            "[%s] classify: %s | marketPrice: %s | ssuInfo: %s",
+            idx, car["classify"], car["marketPrice"], car["ssuInfo"],
+            extra={"event": "inventory_match", **car},
+        )
     return True
 
 
+def merge_conditions(pairs) -> dict:
+    """合并 --count 条件，同一分面重复出现时取值合并（任一命中）"""
+    conditions = {}
+    for facet, values in pairs:
+        merged = conditions.setdefault(facet, [])
+        merged.extend(value for value in values if value not in merged)
+    return {facet: tuple(values) for facet, values in conditions.items()}
+
+
+def run_facet_query(args, logger):
+    """单次拉取后在索引上做分面统计，不进入定时窗口循环"""
+    index = InventoryIndex()
+    index.update(pull_inventory(args.cookie, logger, args.deadline, args.hedge_after, args.max_price,
+                                all_pages=True))
+
+    if args.count:
+        conditions = merge_conditions(args.count)
+        count = index.count(max_price=args.max_price, **conditions)
+        logger.warning("命中数量：%s（条件：%s，价格上限：%s）", count, conditions, args.max_price,
+                       extra={"event": "facet_count", "count": count, "conditions": conditions,
+                              "max_price": args.max_price})
+
+    for facet in args.facet_counts or ():
+        counts = index.facet_counts(facet)
+        logger.warning("分面 %s：%s", facet, counts,
+                       extra={"event": "facet_counts", "facet": facet, "counts": counts})
+
+
 def main():
-    logger = setup_logger()
     args = parse_args()
+    logger = setup_logger(args)
+
+    if args.count or args.facet_counts:
+        run_facet_query(args, logger)
+        return
 
     # 循环 sleep 步长（秒）
     sleep_steps = [0, 5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60]
@@ -159,6 +505,9 @@ def main():
     # 精准触发窗口 ±5秒
     tolerance = timedelta(seconds=5)
 
+    # 跨轮次复用的库存索引
+    index = InventoryIndex()
+
     # 目标触发时间（今天 11:00 和 23:00）
     now = datetime.now()
     today = now.date()
@@ -174,11 +523,11 @@ def main():
         # 判断是否在触发窗口
         hit_window = any(abs(now - t_target) <= tolerance for t_target in target_times)
         if hit_window:
-            query_inventory(args.cookie, logger)
+            query_inventory(args.cookie, logger, index, args.deadline, args.hedge_after, args.max_price)
             logger.warning(f"精准触发时间：{now}, 退出循环")
             continue  # 一旦命中立即退出循环xxx不对，应该是命中后继续循环，指导下一次没命中
         else:
-            logger.warning(f"当前时间 {now} 不在触发窗口，继续 sleep")
+            logger.warning("当前时间 %s 不在触发窗口，继续 sleep", now, extra={"event": "window_miss"})
 
 
 if __name__ == "__main__":
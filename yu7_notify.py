@@ -10,19 +10,25 @@ import argparse
 import logging
 from datetime import datetime, timedelta
 
-logging.basicConfig(level=logging.WARNING, format="%(message)s")  # 设置日志级别
-# logging.basicConfig(level=logging.INFO)
+from http_deadline import post_with_deadline
+from log_pipeline import register_secret, sample_rate, setup_logging
+
 logger = logging.getLogger(__name__)
 BIN = os.path.dirname(os.path.realpath(__file__))
 config_path = os.path.join(BIN, "config.toml")
 badge_week = None
+# 接口端到端截止时间（秒），避免卡住定时任务
+REQUEST_DEADLINE = 15
+ORDER_DETAIL_URL = "https://api.retail.xiaomiev.com/mtop/car-order/order/detail"
+CARSHOP_URL = "https://carshop-api.retail.xiaomiev.com/mtop/carlife/product/info"
+BARK_URL = "https://api.day.app/{token}"
 
 
 def load_config():
     config = toml.load(config_path)
 
     if args.cookie:
-        print("使用命令行参数传入账号参数...")
+        logger.warning("使用命令行参数传入账号参数...")
         return (
             args.orderId,
             args.userId,
@@ -36,7 +42,7 @@ def load_config():
         )
 
     try:
-        print("使用config.toml传入账号参数...")
+        logger.warning("使用config.toml传入账号参数...")
         return (
             config["account"]["orderId"],
             config["account"]["userId"],
@@ -53,7 +59,7 @@ def load_config():
             config["notice"]["errorTimes"],
         )
     except:
-        print("请检查config.toml文件的参数是否完整/正确！")
+        logger.error("请检查config.toml文件的参数是否完整/正确！")
         sys.exit()
 
 
@@ -85,7 +91,7 @@ def calculate_delivery_date(delivery_time, lock_time):
 
 
 def get_order_detail(orderId, userId, Cookie):
-    url = "https://api.retail.xiaomiev.com/mtop/car-order/order/detail"
+    url = ORDER_DETAIL_URL
 
     payload = [{"orderId": orderId, "userId": userId}]
 
@@ -101,7 +107,9 @@ def get_order_detail(orderId, userId, Cookie):
         "Cookie": Cookie,
     }
 
-    response = requests.post(url, data=json.dumps(payload), headers=headers)
+    response = post_with_deadline(
+        url, REQUEST_DEADLINE, data=json.dumps(payload), headers=headers
+    )
 
     data = response.json().get("data", {})
     logo_link = data.get("backdropPictures", {}).get("backdropPicture", None)
@@ -129,7 +137,7 @@ def get_order_detail(orderId, userId, Cookie):
             error_times=error_times_update,
         )
         if error_times_update <= 3:
-            send_bark_message(device_token, message, orderStatusName="account参数错误")
+            send_to_subscribers(message, order_status_name="account参数错误")
 
         logger.warning(delivery_time)
         sys.exit()
@@ -158,7 +166,7 @@ def get_carshop_info(Cookie):
     if not Cookie:
         return None
 
-    url = "https://carshop-api.retail.xiaomiev.com/mtop/carlife/product/info"
+    url = CARSHOP_URL
 
     payload = [{}, {"productId": "21430", "servicePackageVersion": 2}]
 
@@ -173,7 +181,9 @@ def get_carshop_info(Cookie):
         "Cookie": Cookie,
     }
 
-    response = requests.post(url, data=json.dumps(payload), headers=headers)
+    response = post_with_deadline(
+        url, REQUEST_DEADLINE, data=json.dumps(payload), headers=headers
+    )
     notice = response.json().get("data", {}).get("product", {}).get("notice", None)
     if not notice:
         return None, None
@@ -226,7 +236,7 @@ def send_bark_message(token, message, logo_link=None, order_status_name=None):
     else:
         title = f"【小米汽车】进度查询({current_time})"
 
-    url = f"https://api.day.app/{token}"
+    url = BARK_URL.format(token=token)
     headers = {
         "Content-Type": "application/json; charset=utf-8",
     }
@@ -242,32 +252,71 @@ def send_bark_message(token, message, logo_link=None, order_status_name=None):
     if badge_week:
         data["badge"] = badge_week
 
-    response = requests.post(url, headers=headers, json=data)
+    response = post_with_deadline(url, REQUEST_DEADLINE, headers=headers, json=data)
     if response.status_code == 200:
         return True
     else:
-        print("请检查Bark的token是否正确！")
-        sys.exit()
-
-
-def main():
+        logger.error("请检查Bark的token是否正确！")
+        return False
+
+
+def split_device_tokens(device_token):
+    # 多个订阅者用逗号分隔 device_token，重复的只保留一个
+    tokens = [token.strip() for token in (device_token or "").split(",")]
+    return list(dict.fromkeys(token for token in tokens if token))
+
+
+def send_to_subscribers(message, logo_link=None, order_status_name=None):
+    # 同一订单只查询一次，结果分发给所有订阅者；单个 token 失败不影响其他订阅者
+    results = []
+    for token in device_tokens:
+        try:
+            results.append(send_bark_message(token, message, logo_link, order_status_name))
+        except (requests.RequestException, TimeoutError) as e:
+            logger.error(f"Bark推送失败：{e}")
+            results.append(False)
+    return bool(results) and all(results)
+
+
+def handle_order_update(delivery_time, order_status, message, order_status_name, logo_link, vid,
+                        old_delivery_time, carshop_notice, old_carshop_notice):
+    """
+    根据本次查询结果判定是否需要保存并推送，返回 vid_offline / updated / unchanged
+    vid 已下线时每次都推送且不保存配置
+    """
     if vid.startswith("HXM"):
-        if send_bark_message(device_token, message, logo_link, order_status_name):
-            print("vid状态已更新，消息已发送成功！")
+        if send_to_subscribers(message, logo_link, order_status_name):
+            logger.warning("vid状态已更新，消息已发送成功！")
         else:
-            print("vid状态已更新，消息发送失败。")
-        sys.exit()
+            logger.error("vid状态已更新，消息发送失败。")
+        return "vid_offline"
 
     if (delivery_time != old_delivery_time) or (carshop_notice != old_carshop_notice):
         save_config(
             delivery_time, order_status, carshop_notice=carshop_notice
         )  # 更新配置文件
-        if send_bark_message(device_token, message, logo_link, order_status_name):
-            print("消息已发送成功！")
+        if send_to_subscribers(message, logo_link, order_status_name):
+            logger.warning("消息已发送成功！")
         else:
-            print("消息发送失败。")
-    else:
-        print("交付时间/vid没有更新。")
+            logger.error("消息发送失败。")
+        return "updated"
+
+    logger.warning("交付时间/vid没有更新。")
+    return "unchanged"
+
+
+def main():
+    handle_order_update(
+        delivery_time,
+        order_status,
+        message,
+        order_status_name,
+        logo_link,
+        vid,
+        old_delivery_time,
+        carshop_notice,
+        old_carshop_notice,
+    )
 
 
 if __name__ == "__main__":
@@ -281,9 +330,12 @@ if __name__ == "__main__":
     parser.add_argument(
         "--device_token",
         type=str,
-        help="Device Token",
+        help="Device Token, separate multiple subscribers with commas",
     )
+    parser.add_argument("--log-format", choices=["text", "json"], default="text", help="Log format")
+    parser.add_argument("--log-sample", action="append", type=sample_rate, metavar="EVENT=N", help="Keep 1 of N logs for EVENT")
     args = parser.parse_args()
+    setup_logging(args.log_format, sample_rates=args.log_sample)
     # print(args)
     (
         orderId,
@@ -296,6 +348,8 @@ if __name__ == "__main__":
         remarks,
         error_times,
     ) = load_config()
+    device_tokens = split_device_tokens(device_token)
+    register_secret(userId, Cookie, carshop_cookie, *device_tokens)
     carshop_notice, carshop_notice_text = get_carshop_info(carshop_cookie)
     delivery_time, order_status, message, order_status_name, logo_link, vid = (
         get_order_detail(orderId, userId, Cookie)
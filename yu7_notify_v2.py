@@ -1,4 +1,3 @@
-import requests
 import json
 import os
 import sys
@@ -8,16 +7,20 @@ import logging
 from datetime import datetime, timedelta
 import toml
 
+from http_deadline import post_with_deadline
+from log_pipeline import register_secret, sample_rate, setup_logging
+
 # =====================
 # 基础配置
 # =====================
-logging.basicConfig(level=logging.WARNING, format="%(message)s")
 logger = logging.getLogger(__name__)
 
 BIN = os.path.dirname(os.path.realpath(__file__))
 config_path = os.path.join(BIN, "config.toml")
 
 badge_week = None
+# 接口端到端截止时间（秒），避免卡住定时任务
+REQUEST_DEADLINE = 15
 
 # =====================
 # 配置加载
@@ -87,7 +90,9 @@ def get_order_detail(orderId, userId, Cookie):
         "Cookie": Cookie,
     }
 
-    response = requests.post(url, data=json.dumps(payload), headers=headers)
+    response = post_with_deadline(
+        url, REQUEST_DEADLINE, data=json.dumps(payload), headers=headers
+    )
 
     try:
         resp_json = response.json()
@@ -227,11 +232,11 @@ def notify_wecom(result: dict, webhook_key: str):
         "Content-Type": "application/json"
     }
 
-    response = requests.post(
+    response = post_with_deadline(
         url,
+        REQUEST_DEADLINE,
         data=json.dumps(payload, ensure_ascii=False),
         headers=headers,
-        timeout=10
     )
 
     response.raise_for_status()
@@ -258,7 +263,10 @@ if __name__ == "__main__":
     parser.add_argument("--userId", type=str)
     parser.add_argument("--cookie", type=str)
     parser.add_argument("--wechat_key", type=str)
+    parser.add_argument("--log-format", choices=["text", "json"], default="text")
+    parser.add_argument("--log-sample", action="append", type=sample_rate, metavar="EVENT=N")
     args = parser.parse_args()
+    setup_logging(args.log_format, sample_rates=args.log_sample)
 
     (
         orderId,
@@ -280,6 +288,7 @@ if __name__ == "__main__":
         wechat_key = args.wechat_key
 
     try:
+        register_secret(userId, Cookie, wechat_key)
         logger.warning("========== 参数校验 ==========")
         logger.warning(f"orderId: {orderId[:5]}")
         logger.warning(f"userId: {userId[:5]}")